@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple
+
+from app.core import BengaliRAGSystem
+
+
+class QueryBatcher:
+    """In-process dynamic batching for single-query searches.
+
+    Requests are queued as (query, k, future). A background task collects up to
+    ``max_batch`` of them, waiting at most ``max_wait_ms`` after the first one
+    arrives, runs one ``search_batch`` call (one encoder forward pass + one
+    k-NN search) in ``executor`` and resolves each future with its own results.
+    With ``max_wait_ms=0`` it never waits and only batches the requests that
+    queued up while the previous batch was running.
+    """
+
+    def __init__(self, rag_system: BengaliRAGSystem, max_batch: int = 32, max_wait_ms: float = 5.0,
+                 executor: Optional[Executor] = None):
+        self.rag_system = rag_system
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def search(self, query: str, k: int = 5) -> List[Dict]:
+        if self._task is None:
+            raise RuntimeError("QueryBatcher not started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, k, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, int, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            queries = [query for query, _, _ in batch]
+            try:
+                # One search at the largest k; ranks are a prefix, so smaller requests are truncated
+                max_k = max(k for _, k, _ in batch)
+                results = await loop.run_in_executor(self.executor, self.rag_system.search_batch, queries, max_k)
+            except Exception as e:
+                # Fail only this batch's requests; the task keeps serving later batches
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, k, future), query_results in zip(batch, results):
+                if not future.done():
+                    future.set_result(query_results[:k])
@@ -1,12 +1,24 @@
 from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import orjson
 from app.core import BengaliRAGSystem
+from app.api.batching import QueryBatcher
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson; hot endpoints return plain dicts through it, skipping Pydantic."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
 app = FastAPI(
     title="Bengali RAG System API",
     description="Retrieval-Augmented Generation System for Bengali Question-Answer Dataset",
@@ -23,6 +35,22 @@ app.add_middleware(
 )
 
 rag_system = None
+query_batcher = None
+
+# Search is CPU-bound (encoder forward pass + index scan); FAISS and torch release the GIL,
+# so running it in a shared pool keeps the event loop free to accept other requests.
+# Each search already fans out over torch's intra-op threads, so a few concurrent searches saturate
+# the CPU; more only oversubscribe it. RAG_SEARCH_WORKERS overrides the pool size.
+SEARCH_WORKERS = int(os.environ.get('RAG_SEARCH_WORKERS', min(4, os.cpu_count() or 4)))
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="rag-search")
+
+# Dynamic batching of single-query requests (/search, /ask, /chat); RAG_MICROBATCH_WAIT_MS=0 only
+# batches requests that pile up while the encoder is busy, RAG_MICROBATCH_MAX=1 turns batching off
+MICROBATCH_MAX = int(os.environ.get('RAG_MICROBATCH_MAX', '32'))
+MICROBATCH_WAIT_MS = float(os.environ.get('RAG_MICROBATCH_WAIT_MS', '5'))
+
+# Upper bound on queries per /search/batch call, keeps a single request from monopolising the encoder
+MAX_BATCH = 128
 
 
 class SearchRequest(BaseModel):
@@ -32,8 +60,8 @@ class SearchRequest(BaseModel):
 
 class SearchResult(BaseModel):
     rank: int
-    id: int
-    question_id: int
+    id: Optional[int] = None
+    question_id: Optional[int] = None
     question: str
     question_cleaned: str
     option_1: Optional[str] = None
@@ -56,9 +84,27 @@ class SearchResponse(BaseModel):
     system_stats: dict
 
 
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=MAX_BATCH)
+    k: int = Field(5, ge=1, le=50)
+
+
+class BatchSearchItem(BaseModel):
+    query: str
+    results: List[SearchResult]
+    total_results: int
+
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchItem]
+    total_queries: int
+    system_stats: dict
+
+
 class SystemStats(BaseModel):
     total_questions: int
     model_name: str
+    index_type: Optional[str] = None
     embedding_dimension: Optional[int]
     has_embeddings: bool
     has_index: bool
@@ -66,7 +112,7 @@ class SystemStats(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    k: Optional[int] = 3
+    k: int = Field(3, ge=1, le=50)
 
 class ChatResponse(BaseModel):
     user_message: str
@@ -75,20 +121,30 @@ class ChatResponse(BaseModel):
     alternatives: Optional[list]
 
 
+async def run_in_search_pool(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(search_executor, partial(func, *args, **kwargs))
+
+
 @app.on_event("startup")
 async def startup_event():
-    global rag_system
+    global rag_system, query_batcher
     try:
         print("Initializing RAG system...")
         rag_system = BengaliRAGSystem()
 
-        if os.path.exists('embeddings.pkl'):
+        if BengaliRAGSystem.saved_embeddings_exist('embeddings'):
             print("Loading existing embeddings...")
-            rag_system.load_embeddings('embeddings.pkl')
+            rag_system.load_embeddings('embeddings')
         else:
             print("Computing new embeddings...")
             rag_system.load_data('questions.csv')
-            rag_system.compute_embeddings('embeddings.pkl')
+            rag_system.compute_embeddings('embeddings')
+
+        if MICROBATCH_MAX > 1:
+            query_batcher = QueryBatcher(rag_system, max_batch=MICROBATCH_MAX, max_wait_ms=MICROBATCH_WAIT_MS,
+                                         executor=search_executor)
+            query_batcher.start()
 
         print("RAG system initialized successfully!")
 
@@ -97,6 +153,19 @@ async def startup_event():
         raise e
 
 
+async def search_one(query: str, k: int):
+    if query_batcher is not None:
+        return await query_batcher.search(query, k)
+    return await run_in_search_pool(rag_system.search, query, k=k)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if query_batcher is not None:
+        await query_batcher.stop()
+    search_executor.shutdown(wait=False)
+
+
 @app.get("/")
 async def root():
     return {
@@ -104,54 +173,70 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "search": {"method": "GET", "path": "/search", "params": ["query", "k"]},
+            "search_batch": {"method": "POST", "path": "/search/batch", "body": ["queries", "k"]},
             "stats": {"method": "GET", "path": "/stats"},
             "health": {"method": "GET", "path": "/health"}
         }
     }
 
 
-@app.get("/search", response_model=SearchResponse)
+# response_model on the hot endpoints only documents the schema: returning a Response skips validation
+@app.get("/search", response_model=SearchResponse, response_class=ORJSONResponse)
 async def search(query: str = Query(..., description="Search query"), k: int = Query(5, ge=1, le=50, description="Number of results to return")):
     if rag_system is None:
         raise HTTPException(status_code=503, detail="RAG system not initialized")
     try:
-        results = rag_system.search(query, k=k)
-        search_results = [SearchResult(**result) for result in results]
-        return SearchResponse(query=query, results=search_results, total_results=len(search_results), system_stats=rag_system.get_stats())
+        results = await search_one(query, k)
+        return ORJSONResponse({"query": query, "results": results, "total_results": len(results), "system_stats": rag_system.get_stats()})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
 
-@app.get("/ask")
+@app.post("/search/batch", response_model=BatchSearchResponse, response_class=ORJSONResponse)
+async def search_batch(request: BatchSearchRequest):
+    if rag_system is None:
+        raise HTTPException(status_code=503, detail="RAG system not initialized")
+    try:
+        batch_results = await run_in_search_pool(rag_system.search_batch, request.queries, k=request.k)
+        items = [
+            {"query": query, "results": results, "total_results": len(results)}
+            for query, results in zip(request.queries, batch_results)
+        ]
+        return ORJSONResponse({"results": items, "total_queries": len(items), "system_stats": rag_system.get_stats()})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch search error: {str(e)}")
+
+
+@app.get("/ask", response_class=ORJSONResponse)
 async def ask(query: str = Query(..., description="Question to ask"), k: int = Query(3, ge=1, le=10)):
     if rag_system is None:
         raise HTTPException(status_code=503, detail="RAG system not initialized")
     try:
-        results = rag_system.search(query, k=k)
+        results = await search_one(query, k)
         top = results[0] if results else None
-        return {
+        return ORJSONResponse({
             "query": query,
             "answer": top.get("answer_text") if top else None,
             "match": top,
             "alternatives": results[1:]
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ask error: {str(e)}")
 
 
-@app.post("/chat", response_model=ChatResponse)
+@app.post("/chat", response_model=ChatResponse, response_class=ORJSONResponse)
 async def chat(request: ChatRequest):
     if rag_system is None:
         raise HTTPException(status_code=503, detail="RAG system not initialized")
     try:
-        results = rag_system.search(request.message, k=request.k)
+        results = await search_one(request.message, request.k)
         top = results[0] if results else None
-        return ChatResponse(
-            user_message=request.message,
-            answer=top.get("answer_text") if top else None,
-            match=top,
-            alternatives=results[1:]
-        )
+        return ORJSONResponse({
+            "user_message": request.message,
+            "answer": top.get("answer_text") if top else None,
+            "match": top,
+            "alternatives": results[1:]
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
@@ -0,0 +1,116 @@
+import numpy as np
+
+try:
+    from numba import get_num_threads, njit, prange
+except ImportError:
+    njit = None
+
+
+# Dimensions accumulated between two bound checks in the pruned scan
+PRUNE_BLOCK = 32
+
+
+def tail_norms(embeddings: np.ndarray, block: int = PRUNE_BLOCK) -> np.ndarray:
+    """(n, n_blocks) L2 norm of each row's dimensions from block b onwards, for the pruned scan's bound."""
+    n, dim = embeddings.shape
+    n_blocks = -(-dim // block)
+    squares = np.zeros((n, n_blocks * block), dtype=np.float32)
+    squares[:, :dim] = np.square(embeddings, dtype=np.float32)
+    block_sums = squares.reshape(n, n_blocks, block).sum(axis=2)
+    return np.ascontiguousarray(np.sqrt(np.cumsum(block_sums[:, ::-1], axis=1)[:, ::-1]), dtype=np.float32)
+
+
+if njit is not None:
+    @njit(fastmath=True, cache=True)
+    def _topk_pruned_one(embeddings, row_tails, query, k, block):
+        n, dim = embeddings.shape
+        n_blocks = row_tails.shape[1]
+        query_tails = np.zeros(n_blocks + 1, dtype=np.float32)
+        for b in range(n_blocks - 1, -1, -1):
+            s = 0.0
+            for j in range(b * block, min((b + 1) * block, dim)):
+                s += query[j] * query[j]
+            query_tails[b] = np.sqrt(query_tails[b + 1] * query_tails[b + 1] + s)
+
+        best_sims = np.full(k, -np.inf, dtype=np.float32)
+        best_idx = np.full(k, -1, dtype=np.int64)
+        filled = 0
+        worst = 0
+        for i in range(n):
+            dot = 0.0
+            pruned = False
+            for b in range(n_blocks):
+                # Cauchy-Schwarz on the unseen dimensions bounds the final score from above
+                if filled == k and b > 0 and dot + row_tails[i, b] * query_tails[b] <= best_sims[worst]:
+                    pruned = True
+                    break
+                for j in range(b * block, min((b + 1) * block, dim)):
+                    dot += embeddings[i, j] * query[j]
+            if pruned or (filled == k and dot <= best_sims[worst]):
+                continue
+            slot = filled if filled < k else worst
+            best_sims[slot] = dot
+            best_idx[slot] = i
+            if filled < k:
+                filled += 1
+            if filled == k:
+                worst = np.argmin(best_sims)
+
+        order = np.argsort(-best_sims[:filled])
+        return best_sims[:filled][order], best_idx[:filled][order]
+
+    @njit(fastmath=True, cache=True)
+    def topk_pruned(embeddings, row_tails, queries, k, block=PRUNE_BLOCK):
+        """Exact top-k by dot product, skipping a row once its score bound cannot beat the current k-th best.
+
+        Returns (similarities, indices) of shape (n_queries, k), best first.
+        """
+        similarities = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        indices = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        for q in range(queries.shape[0]):
+            sims, idx = _topk_pruned_one(embeddings, row_tails, queries[q], k, block)
+            similarities[q, :len(sims)] = sims
+            indices[q, :len(idx)] = idx
+        return similarities, indices
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _topk_dot(embeddings, queries, k, n_chunks):
+        """Exact top-k by dot product: rows are split into chunks scanned in parallel, each keeping its own
+        top-k per query, then the n_chunks * k candidates are merged. Returns (similarities, indices), best first.
+        """
+        n, dim = embeddings.shape
+        n_queries = queries.shape[0]
+        chunk = -(-n // n_chunks)
+        cand_sims = np.full((n_queries, n_chunks * k), -np.inf, dtype=np.float32)
+        cand_idx = np.full((n_queries, n_chunks * k), -1, dtype=np.int64)
+        for c in prange(n_chunks):
+            base = c * k
+            for i in range(c * chunk, min((c + 1) * chunk, n)):
+                for q in range(n_queries):
+                    dot = np.float32(0.0)
+                    for j in range(dim):
+                        dot += embeddings[i, j] * queries[q, j]
+                    # Replace this chunk's current worst candidate when beaten
+                    worst = base
+                    for s in range(base + 1, base + k):
+                        if cand_sims[q, s] < cand_sims[q, worst]:
+                            worst = s
+                    if dot > cand_sims[q, worst]:
+                        cand_sims[q, worst] = dot
+                        cand_idx[q, worst] = i
+
+        similarities = np.empty((n_queries, k), dtype=np.float32)
+        indices = np.empty((n_queries, k), dtype=np.int64)
+        for q in range(n_queries):
+            order = np.argsort(-cand_sims[q])[:k]
+            similarities[q] = cand_sims[q][order]
+            indices[q] = cand_idx[q][order]
+        return similarities, indices
+
+    def topk_dot(embeddings: np.ndarray, queries: np.ndarray, k: int):
+        # A few chunks per thread keeps cores busy when chunk scan times differ
+        n_chunks = max(1, min(len(embeddings), 4 * get_num_threads()))
+        return _topk_dot(embeddings, queries, k, n_chunks)
+else:
+    topk_pruned = None
+    topk_dot = None
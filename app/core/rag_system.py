@@ -1,200 +1,821 @@
 import pandas as pd
 import numpy as np
+import json
+import hashlib
 import pickle
 import os
-from typing import List, Dict, Optional
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+import torch
 from sentence_transformers import SentenceTransformer
-from sklearn.neighbors import NearestNeighbors
 import re
 from sentence_transformers import CrossEncoder
 from rank_bm25 import BM25Okapi
 import openai
+from app.core.kernels import tail_norms, topk_dot, topk_pruned
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu has no wheel for some platforms; fall back to brute force
+    faiss = None
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+try:
+    import hnswlib
+except ImportError:  # only needed for index_type='hnsw' when faiss is unavailable
+    hnswlib = None
+
+
+# Fast (Rust) tokenizers batch-tokenize across threads; respect an explicit user setting
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'true')
+
+# Precompiled once; used by both the per-query and the vectorized corpus cleaners
+_RE_TAG = re.compile(r'<[^>]+>')
+_RE_WS = re.compile(r'\s+')
+_RE_NON_BENGALI = re.compile(r'[^\w\s\u0980-\u09FF]')
+_RE_INT = re.compile(r'[+-]?\d+')
+
+# Below this many vectors an exact flat scan is faster than any approximate index
+FLAT_INDEX_MAX_SIZE = 10_000
+
+# CPU corpus builds above this size are sharded across encoder processes; below it the pool start-up dominates
+MULTI_PROCESS_MIN_TEXTS = 5_000
 
 
 class BengaliRAGSystem:
-    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+    INDEX_TYPES = ('auto', 'flat', 'hnsw', 'ivfpq', 'sq8', 'fp16', 'brute', 'int8', 'pruned', 'jit')
+    BACKENDS = ('torch', 'onnx', 'openvino')
+
+    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                 index_type: Optional[str] = None, query_cache_size: int = 1024, backend: Optional[str] = None,
+                 backend_file: Optional[str] = None, device: Optional[str] = None):
+        index_type = index_type or os.environ.get('RAG_INDEX_TYPE', 'auto')
+        if index_type not in self.INDEX_TYPES:
+            raise ValueError(f"Unknown index_type '{index_type}'. Expected one of {self.INDEX_TYPES}")
+        backend = backend or os.environ.get('RAG_ENCODER_BACKEND', 'torch')
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Expected one of {self.BACKENDS}")
         self.model_name = model_name
+        self.index_type = index_type
+        self.backend = backend
+        # Exported model file for the onnx/openvino backends, e.g. 'onnx/model_qint8_avx512_vnni.onnx'
+        self.backend_file = backend_file or os.environ.get('RAG_ENCODER_FILE') or None
         self.model = None
+        # None picks CUDA when available; 'cpu' (or RAG_DEVICE=cpu) keeps the encoder off the GPU
+        self.requested_device = device or os.environ.get('RAG_DEVICE') or None
+        self.device = None
         self.data = None
         self.embeddings = None
+        # blake2b-64 of each row's embedding text, so a rebuild only re-encodes new or changed rows
+        self.content_hashes: Optional[np.ndarray] = None
         self.nn_index = None
+        # index_type='int8': per-vector symmetric int8 codes scanned with SimSIMD
+        self.embeddings_i8 = None
+        # index_type='fp16' without faiss: half-precision copy scanned with fp32 accumulation
+        self.embeddings_f16 = None
+        # index_type='hnsw' without faiss: hnswlib graph over the normalized vectors
+        self.hnsw_index = None
+        # index_type='pruned': per-block tail norms bounding the early-abort scan
+        self.tail_norms = None
         self.questions_cleaned: List[str] = []
+        # Struct-of-arrays copy of the result columns (plain lists, NaN -> None) read by search
+        self._result_columns: List[Tuple[str, list]] = []
+        # LRU of (cleaned query, k) -> (indices, similarities); set query_cache_size=0 to disable
+        self.query_cache_size = query_cache_size
+        self._query_cache: "OrderedDict[Tuple[str, int], Tuple[tuple, tuple]]" = OrderedDict()
+        # LRU of cleaned query -> normalized embedding, so a repeat with a different k skips the encoder.
+        # Depends only on the model, so it survives index rebuilds and is cleared in initialize_model.
+        self._embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
 
     def load_data(self, csv_path: str) -> pd.DataFrame:
         print(f"Loading data from {csv_path}...")
         self.data = pd.read_csv(csv_path)
+        self._cast_integer_columns()
 
         print("Cleaning data...")
         self.data = self.data.dropna(subset=['Question'])
-        self.questions_cleaned = []
-        for question in self.data['Question']:
-            cleaned = self._clean_text(question)
-            self.questions_cleaned.append(cleaned)
-        self.data['Question_Cleaned'] = self.questions_cleaned
-        self.data = self.data[self.data['Question_Cleaned'].str.strip() != '']
+        self.data['Question_Cleaned'] = self._clean_series(self.data['Question'])
+        self.data = self.data[self.data['Question_Cleaned'] != '']
+        self.questions_cleaned = self.data['Question_Cleaned'].tolist()
+        self._add_derived_columns()
+        self._materialize_result_columns()
 
         print(f"Loaded {len(self.data)} questions after cleaning")
         return self.data
 
+    INTEGER_COLUMNS = ['ID', 'Question ID', 'Difficulty']
+
+    def _cast_integer_columns(self):
+        # Nullable Int64 once at load: hits then carry Python ints / None, with no per-hit int() parsing.
+        # Non-numeric values (e.g. a stray 'a' in Difficulty) become missing instead of failing at query time.
+        for col in self.INTEGER_COLUMNS:
+            if col in self.data.columns and self.data[col].dtype != 'Int64':
+                self.data[col] = np.trunc(pd.to_numeric(self.data[col], errors='coerce')).astype('Int64')
+
+    def _add_derived_columns(self):
+        """Precompute per-row values that search results would otherwise derive on every query."""
+        self.data['Answer_Text'] = self._resolve_answer_text(self.data)
+
+    def _materialize_result_columns(self):
+        """Plain per-column lists for the search hot path; positional list indexing skips pandas' indexers."""
+        frame = self.data[list(self.RESULT_FIELDS)]
+        frame = frame.astype(object).where(frame.notna(), None)
+        self._result_columns = [(key, frame[column].tolist()) for column, key in self.RESULT_FIELDS.items()]
+
+    @staticmethod
+    def _resolve_answer_text(data: pd.DataFrame) -> np.ndarray:
+        """Vectorized answer lookup: "1".."5" pick that option, otherwise an option whose text equals the
+        answer, otherwise the answer itself; None when there is no answer."""
+        n = len(data)
+        rows = np.arange(n)
+        option_frame = data[[f"Option {i}" for i in range(1, 6)]]
+        options = option_frame.astype(object).where(option_frame.notna(), None).to_numpy(dtype=object)
+
+        answers = data['Answer']
+        has_answer = answers.notna().to_numpy()
+        # object dtype keeps .str on Python's `re`, so \d accepts Bengali digits just like int()
+        answer_raw = answers.fillna('').astype(str).astype(object)
+        answer_stripped = answer_raw.str.strip()
+
+        is_int = answer_stripped.str.fullmatch(_RE_INT).fillna(False).to_numpy(dtype=bool)
+        answer_num = np.zeros(n, dtype=np.int64)
+        answer_num[is_int] = answer_stripped[is_int].map(int).to_numpy(dtype=np.int64)
+        by_position = has_answer & is_int & (answer_num >= 1) & (answer_num <= 5)
+
+        option_stripped = option_frame.fillna('').astype(str).apply(lambda col: col.str.strip()).to_numpy(dtype=object)
+        matches = option_frame.notna().to_numpy() & (option_stripped == answer_stripped.to_numpy(dtype=object)[:, None])
+        by_text = has_answer & ~by_position & matches.any(axis=1)
+
+        answer_text = answer_raw.to_numpy(dtype=object).copy()
+        answer_text[by_text] = options[rows, matches.argmax(axis=1)][by_text]
+        answer_text[by_position] = options[rows, np.clip(answer_num - 1, 0, 4)][by_position]
+        answer_text[~has_answer] = None
+        return answer_text
+
     def _clean_text(self, text: str) -> str:
         if pd.isna(text):
             return ""
 
-        text = re.sub(r'<[^>]+>', '', text)
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'[^\w\s\u0980-\u09FF]', ' ', text)
+        text = _RE_TAG.sub('', text)
+        text = _RE_NON_BENGALI.sub(' ', text)
+        # Collapse whitespace last so spaces introduced by the punctuation pass are squeezed too
+        text = _RE_WS.sub(' ', text)
 
         return text.strip()
 
+    @staticmethod
+    def _clean_series(texts: pd.Series) -> pd.Series:
+        """Vectorized ``_clean_text`` over a whole column (NaN becomes '')."""
+        # Compiled patterns keep pandas on Python's `re` (Unicode \w), matching _clean_text exactly
+        return (
+            texts.fillna('').astype(str)
+            .str.replace(_RE_TAG, '', regex=True)
+            .str.replace(_RE_NON_BENGALI, ' ', regex=True)
+            .str.replace(_RE_WS, ' ', regex=True)
+            .str.strip()
+        )
+
     def initialize_model(self):
-        print(f"Loading model: {self.model_name}")
-        self.model = SentenceTransformer(self.model_name)
+        self._configure_torch_threads()
+        self.device = self.requested_device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        print(f"Loading model: {self.model_name} on {self.device} ({self.backend} backend)")
+        with self._query_cache_lock:
+            self._embedding_cache.clear()
+        if self.backend == 'torch':
+            self.model = SentenceTransformer(self.model_name, device=self.device)
+        else:
+            # ONNX Runtime / OpenVINO export (sentence-transformers>=3.2 with the matching extra installed)
+            model_kwargs = {'file_name': self.backend_file} if self.backend_file else None
+            self.model = SentenceTransformer(self.model_name, device=self.device, backend=self.backend,
+                                             model_kwargs=model_kwargs)
+        if self._on_cuda() and self.backend == 'torch':
+            # fp16 weights: tensor-core matmuls and half the activation memory
+            self.model.half()
         print("Model loaded successfully!")
 
+    def _on_cuda(self) -> bool:
+        # device stays None when the model was assigned directly instead of via initialize_model
+        return (self.device or '').startswith('cuda')
+
+    @staticmethod
+    def _configure_torch_threads():
+        # torch defaults to one intra-op thread per logical core, which oversubscribes small forward
+        # passes and competes with the search thread pool; RAG_TORCH_THREADS overrides the cap
+        threads = int(os.environ.get('RAG_TORCH_THREADS', min(8, os.cpu_count() or 4)))
+        if torch.get_num_threads() != threads:
+            torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # may only be set once, before any inter-op work has started
+
     def compute_embeddings(self, save_path: Optional[str] = None):
         if self.model is None:
             self.initialize_model()
 
         print("Computing embeddings for questions...")
 
-        texts_for_embedding: List[str] = []
-        for _, row in self.data.iterrows():
-            text = row['Question_Cleaned']
-            if pd.notna(row['Explain']) and str(row['Explain']).strip():
-                explanation = self._clean_text(str(row['Explain']))
-                text = f"{text} {explanation}"
-            texts_for_embedding.append(text)
-        self.embeddings = self.model.encode(texts_for_embedding, show_progress_bar=True)
+        texts = self._embedding_texts()
+        self.content_hashes = self._content_hashes(texts)
+        embeddings, reused = self._reusable_embeddings(save_path, self.content_hashes)
+        if reused is None:
+            embeddings = self._encode_corpus(texts)
+        else:
+            stale = np.flatnonzero(~reused)
+            print(f"Reusing {int(reused.sum())} saved embeddings, encoding {len(stale)} new or changed rows")
+            if len(stale):
+                embeddings[stale] = self._encode_corpus([texts[i] for i in stale])
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
         print(f"Computed embeddings with shape: {self.embeddings.shape}")
         print("Building nearest neighbors index...")
-        self.nn_index = NearestNeighbors(
-            n_neighbors=min(50, len(self.data)),
-            metric='cosine',
-            algorithm='brute'
-        )
-        self.nn_index.fit(self.embeddings)
+        self._build_index()
         if save_path:
             self.save_embeddings(save_path)
 
+    @staticmethod
+    def _content_hashes(texts: List[str]) -> np.ndarray:
+        return np.fromiter(
+            (int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little') for text in texts),
+            dtype=np.uint64, count=len(texts))
+
+    def _reusable_embeddings(self, save_path: Optional[str], hashes: np.ndarray):
+        """(embeddings, reused mask) filled from the artifacts at ``save_path`` for rows whose text hash was
+        already embedded by the same model and encoder backend. Rows are matched by hash, so inserted or
+        reordered rows are reused too; (None, None) when nothing saved is usable."""
+        if not save_path:
+            return None, None
+        paths = self._artifact_paths(save_path)
+        if not (os.path.exists(paths['meta']) and os.path.exists(paths['hashes'])):
+            return None, None
+        with open(paths['meta'], 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        # Torch and (possibly quantized) ONNX/OpenVINO exports give slightly different vectors; never mix them
+        if (meta.get('model_name'), meta.get('backend'), meta.get('backend_file')) != (
+                self.model_name, self.backend, self.backend_file):
+            print("Saved embeddings were encoded with a different model or backend; re-encoding all rows")
+            return None, None
+        old_hashes = np.load(paths['hashes'])
+        old_embeddings = np.load(paths['embeddings'], mmap_mode='r')
+        if len(old_hashes) != len(old_embeddings) or len(old_hashes) == 0:
+            return None, None
+
+        order = np.argsort(old_hashes)
+        sorted_hashes = old_hashes[order]
+        positions = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+        reused = sorted_hashes[positions] == hashes
+        embeddings = np.empty((len(hashes), old_embeddings.shape[1]), dtype=np.float32)
+        # Copied out of the mmap here: save_embeddings overwrites that file afterwards
+        embeddings[reused] = old_embeddings[order[positions[reused]]]
+        return embeddings, reused
+
+    def _embedding_texts(self) -> List[str]:
+        """Question, plus the cleaned explanation when there is one, per row."""
+        # Built in a helper so the cleaned/concatenated Series are freed before the encoder runs;
+        # only rows that have an explanation get a new concatenated string, the rest reuse the question.
+        texts = self.data['Question_Cleaned'].astype(object)
+        explanations = self._clean_series(self.data['Explain'])
+        has_explanation = (explanations != '').to_numpy()
+        if has_explanation.any():
+            texts = texts.copy()
+            texts[has_explanation] = texts[has_explanation] + ' ' + explanations[has_explanation]
+        return texts.tolist()
+
+    def _encode_corpus(self, texts: List[str]) -> np.ndarray:
+        if self._on_cuda():
+            return self.model.encode(texts, batch_size=256, convert_to_numpy=True, show_progress_bar=True)
+        workers = min(4, os.cpu_count() or 1)
+        if self.backend != 'torch' or workers < 2 or len(texts) <= MULTI_PROCESS_MIN_TEXTS:
+            return self.model.encode(texts, batch_size=64, convert_to_numpy=True, show_progress_bar=True)
+        # Intra-op threading stops scaling at a few cores; independent processes sidestep that and the GIL
+        print(f"Encoding with {workers} CPU processes")
+        pool = self.model.start_multi_process_pool(['cpu'] * workers)
+        try:
+            return self.model.encode(texts, pool=pool, batch_size=64, convert_to_numpy=True)
+        finally:
+            self.model.stop_multi_process_pool(pool)
+
+    def _resolve_index_type(self, n: int) -> str:
+        if self.index_type != 'auto':
+            return self.index_type
+        if n < FLAT_INDEX_MAX_SIZE or (faiss is None and hnswlib is None):
+            return 'flat'
+        return 'hnsw'
+
+    @staticmethod
+    def _normalize_l2(vectors: np.ndarray) -> np.ndarray:
+        if faiss is not None:
+            faiss.normalize_L2(vectors)
+        else:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    @staticmethod
+    def _quantize_int8(vectors: np.ndarray) -> np.ndarray:
+        # One scale per vector (max |x| -> 127): cosine is invariant to it, so no scales need storing.
+        # A shared per-dimension scale would reweight dimensions and skew the cosine ranking.
+        scale = np.maximum(np.abs(vectors).max(axis=1, keepdims=True), 1e-12) / 127.0
+        return np.ascontiguousarray(np.clip(np.round(vectors / scale), -127, 127).astype(np.int8))
+
+    def _build_index(self):
+        self.clear_query_cache()
+        # Cosine similarity == inner product on L2-normalized vectors
+        self._normalize_l2(self.embeddings)
+        n, dim = self.embeddings.shape
+        index_type = self._resolve_index_type(n)
+        self.embeddings_i8 = None
+        self.embeddings_f16 = None
+        self.hnsw_index = None
+        self.tail_norms = None
+        if index_type == 'jit':
+            if topk_dot is None:
+                raise ImportError("index_type 'jit' requires numba (pip install numba)")
+            # No index object: the parallel Numba kernel scans the normalized float32 matrix directly
+            print(f"Using parallel Numba brute-force scan over {n} vectors")
+            self.nn_index = None
+            return
+        if index_type == 'pruned':
+            if topk_pruned is None:
+                raise ImportError("index_type 'pruned' requires numba (pip install numba)")
+            print(f"Using pruned brute-force scan over {n} vectors")
+            self.nn_index = None
+            self.tail_norms = tail_norms(self.embeddings)
+            return
+        if index_type == 'int8':
+            if simsimd is None:
+                raise ImportError("index_type 'int8' requires simsimd (pip install simsimd)")
+            print(f"Quantizing {n} vectors to int8 for SimSIMD search")
+            self.nn_index = None
+            self.embeddings_i8 = self._quantize_int8(self.embeddings)
+            return
+        if index_type == 'fp16' and faiss is None:
+            print(f"Storing {n} vectors as fp16 for brute-force search (faiss not available)")
+            self.nn_index = None
+            self.embeddings_f16 = np.ascontiguousarray(self.embeddings, dtype=np.float16)
+            return
+        if index_type == 'hnsw' and faiss is None and hnswlib is not None:
+            print(f"Using hnswlib 'hnsw' index for {n} vectors (faiss not available)")
+            self.nn_index = None
+            self.hnsw_index = self._build_hnswlib(self.embeddings)
+            return
+        if index_type == 'brute' or faiss is None:
+            if index_type not in ('flat', 'brute'):
+                raise ImportError(f"index_type '{index_type}' requires faiss (pip install faiss-cpu)")
+            # No index object: SimSIMD / NumPy scan the normalized float32 matrix directly
+            print("Using brute-force search" + ("" if faiss is not None else " (faiss not available)"))
+            self.nn_index = None
+            return
+        nlist = max(1, int(4 * np.sqrt(n)))
+        if index_type == 'ivfpq' and n < self.IVFPQ_MIN_POINTS_PER_CENTROID * max(nlist, self.PQ_CODEBOOK_SIZE):
+            print(f"Too few vectors ({n}) to train an IVF-PQ index; using a flat index instead")
+            index_type = 'flat'
+        print(f"Using '{index_type}' index for {n} vectors")
+
+        if index_type == 'hnsw':
+            index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 200
+            index.add(self.embeddings)
+            index.hnsw.efSearch = 64
+        elif index_type == 'ivfpq':
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, self._pq_subquantizers(dim), 8,
+                                     faiss.METRIC_INNER_PRODUCT)
+            index.train(self.embeddings)
+            index.add(self.embeddings)
+            index.nprobe = min(nlist, 16)
+        elif index_type in ('sq8', 'fp16'):
+            # Exact scan over int8 / fp16 codes: 4x / 2x less memory traffic than float32
+            qtype = faiss.ScalarQuantizer.QT_8bit if index_type == 'sq8' else faiss.ScalarQuantizer.QT_fp16
+            index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+            index.train(self.embeddings)
+            index.add(self.embeddings)
+        else:
+            index = faiss.IndexFlatIP(dim)
+            index.add(self.embeddings)
+        self.nn_index = index
+
+    # k-means (coarse and PQ codebooks) wants ~39 training points per centroid; 8-bit PQ has 256 per sub-space
+    IVFPQ_MIN_POINTS_PER_CENTROID = 39
+    PQ_CODEBOOK_SIZE = 256
+
+    @staticmethod
+    def _pq_subquantizers(dim: int) -> int:
+        # PQ needs dim % m == 0: take the largest divisor up to 48 (48 x 8-dim sub-vectors for the 384-d default)
+        return max(m for m in range(1, min(48, dim) + 1) if dim % m == 0)
+
+    @staticmethod
+    def _build_hnswlib(vectors: np.ndarray):
+        # Same graph parameters as the faiss HNSW index; 'ip' distance is 1 - dot on normalized vectors
+        index = hnswlib.Index(space='ip', dim=vectors.shape[1])
+        index.init_index(max_elements=len(vectors), ef_construction=200, M=32)
+        index.add_items(vectors, np.arange(len(vectors)))
+        index.set_ef(64)
+        return index
+
+    @staticmethod
+    def _artifact_paths(path: str) -> Dict[str, str]:
+        # Accept both the artifact base name ('embeddings') and the legacy pickle name ('embeddings.pkl')
+        base = path[:-len('.pkl')] if path.endswith('.pkl') else path
+        return {
+            'embeddings': base + '.npy',
+            'data': base + '.parquet',
+            'meta': base + '.json',
+            'index': base + '.faiss',
+            'int8': base + '.int8.npy',
+            'fp16': base + '.fp16.npy',
+            'hashes': base + '.hashes.npy',
+            'hnsw': base + '.hnsw',
+            'legacy': base + '.pkl',
+        }
+
+    @classmethod
+    def saved_embeddings_exist(cls, path: str) -> bool:
+        paths = cls._artifact_paths(path)
+        return os.path.exists(paths['meta']) or os.path.exists(paths['legacy'])
+
     def save_embeddings(self, path: str):
-        print(f"Saving embeddings to {path}")
+        paths = self._artifact_paths(path)
+        print(f"Saving embeddings to {paths['embeddings']}")
 
         os.makedirs(os.path.dirname(path) if os.path.dirname(path) else '.', exist_ok=True)
-        save_data = {
-            'embeddings': self.embeddings,
-            'model_name': self.model_name,
-            'data': self.data
-        }
-        with open(path, 'wb') as f:
-            pickle.dump(save_data, f)
-        index_path = path.replace('.pkl', '_index.pkl')
-        with open(index_path, 'wb') as f:
-            pickle.dump(self.nn_index, f)
+        np.save(paths['embeddings'], self.embeddings)
+        self.data.to_parquet(paths['data'])
+        if self.nn_index is not None:
+            faiss.write_index(self.nn_index, paths['index'])
+        elif os.path.exists(paths['index']):
+            os.remove(paths['index'])
+        if self.embeddings_i8 is not None:
+            np.save(paths['int8'], self.embeddings_i8)
+        elif os.path.exists(paths['int8']):
+            os.remove(paths['int8'])
+        if self.content_hashes is not None:
+            np.save(paths['hashes'], self.content_hashes)
+        elif os.path.exists(paths['hashes']):
+            os.remove(paths['hashes'])
+        if self.embeddings_f16 is not None:
+            np.save(paths['fp16'], self.embeddings_f16)
+        elif os.path.exists(paths['fp16']):
+            os.remove(paths['fp16'])
+        if self.hnsw_index is not None:
+            self.hnsw_index.save_index(paths['hnsw'])
+        elif os.path.exists(paths['hnsw']):
+            os.remove(paths['hnsw'])
+        # Metadata last: its presence marks a complete set of artifacts
+        with open(paths['meta'], 'w', encoding='utf-8') as f:
+            json.dump({
+                'model_name': self.model_name,
+                'backend': self.backend,
+                'backend_file': self.backend_file,
+                'index_type': self.index_type,
+                # What the saved index artifact was actually built as, e.g. 'hnsw' for index_type='auto'
+                'built_index_type': self._resolve_index_type(int(self.embeddings.shape[0])),
+                'num_embeddings': int(self.embeddings.shape[0]),
+                'embedding_dimension': int(self.embeddings.shape[1]),
+                'has_faiss_index': self.nn_index is not None,
+            }, f, indent=2)
 
         print("Embeddings saved successfully!")
 
     def load_embeddings(self, path: str):
-        print(f"Loading embeddings from {path}")
+        paths = self._artifact_paths(path)
+        if not os.path.exists(paths['meta']) and os.path.exists(paths['legacy']):
+            self._load_legacy_pickle(paths)
+            # One-time migration: later starts memory-map the .npy instead of unpickling the whole matrix
+            try:
+                self.save_embeddings(path)
+            except (OSError, ImportError) as e:
+                print(f"Could not migrate legacy embeddings ({e}); they will be unpickled again next start")
+            self.initialize_model()
+            print("Embeddings loaded successfully!")
+            return
+
+        print(f"Loading embeddings from {paths['embeddings']}")
+        with open(paths['meta'], 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.model_name = meta['model_name']
+        # Queries must be encoded like the corpus was: torch and ONNX/OpenVINO exports give different vectors
+        if 'backend' in meta and meta['backend'] != self.backend:
+            print(f"Embeddings were encoded with the '{meta['backend']}' backend; using it instead of '{self.backend}'")
+            self.backend = meta['backend']
+        if 'backend_file' in meta and meta['backend_file'] != self.backend_file:
+            print(f"Embeddings were encoded from model file {meta['backend_file']!r}; using it instead of "
+                  f"{self.backend_file!r}")
+            self.backend_file = meta['backend_file']
+        # An explicit constructor index_type wins; the saved one only fills in for 'auto'
+        if self.index_type == 'auto':
+            self.index_type = meta.get('index_type', 'auto')
+        self.data = pd.read_parquet(paths['data'])
+        self._cast_integer_columns()
+        if 'Answer_Text' not in self.data.columns:
+            self._add_derived_columns()
+        self._materialize_result_columns()
+        # Memory-mapped: pages are read lazily and shared through the OS page cache.
+        # Saved embeddings are already L2-normalized.
+        self.embeddings = np.load(paths['embeddings'], mmap_mode='r')
+        self.content_hashes = np.load(paths['hashes']) if os.path.exists(paths['hashes']) else None
+
+        self.clear_query_cache()
+        self.nn_index = None
+        self.embeddings_i8 = None
+        self.embeddings_f16 = None
+        self.hnsw_index = None
+        self.tail_norms = None
+        index_type = self._resolve_index_type(len(self.embeddings))
+        built_index_type = meta.get('built_index_type')
+        if built_index_type is None:
+            # Artifacts from before built_index_type was recorded (always saved with faiss available)
+            saved_type = meta.get('index_type', 'auto')
+            built_index_type = saved_type if saved_type != 'auto' else (
+                'flat' if len(self.embeddings) < FLAT_INDEX_MAX_SIZE else 'hnsw')
+        use_hnswlib = index_type == 'hnsw' and faiss is None and hnswlib is not None
+        use_f16 = index_type == 'fp16' and faiss is None
+        if index_type == 'jit':
+            if topk_dot is None:
+                raise ImportError("index_type 'jit' requires numba (pip install numba)")
+        elif index_type == 'pruned':
+            if topk_pruned is None:
+                raise ImportError("index_type 'pruned' requires numba (pip install numba)")
+            # Bounds are cheap to derive from the (already normalized) mmap, so they are not persisted
+            self.tail_norms = tail_norms(self.embeddings)
+        elif index_type == 'int8' and os.path.exists(paths['int8']):
+            # The float32 matrix stays unread on disk; only the 4x smaller int8 codes are scanned
+            self.embeddings_i8 = np.load(paths['int8'], mmap_mode='r')
+        elif use_f16 and os.path.exists(paths['fp16']):
+            # Only the half-size fp16 copy is paged in for search
+            self.embeddings_f16 = np.load(paths['fp16'], mmap_mode='r')
+        elif use_hnswlib and os.path.exists(paths['hnsw']):
+            self.hnsw_index = hnswlib.Index(space='ip', dim=self.embeddings.shape[1])
+            self.hnsw_index.load_index(paths['hnsw'])
+            self.hnsw_index.set_ef(64)
+        elif (faiss is not None and index_type != 'brute' and index_type == built_index_type
+              and os.path.exists(paths['index'])):
+            # IO_FLAG_MMAP_IFC (faiss >= 1.8) maps the stored codes of flat / HNSW / scalar-quantizer indexes,
+            # so uvicorn workers share them through the page cache; plain IO_FLAG_MMAP only maps IVF inverted
+            # lists, and older releases fall back to it (IO_FLAG_READ_ONLY is missing from those as well)
+            io_flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | getattr(faiss, 'IO_FLAG_READ_ONLY', 0)
+            self.nn_index = faiss.read_index(paths['index'], io_flags)
+        elif index_type != 'brute' and (faiss is not None or index_type != 'flat'):
+            # Index artifact missing or built for another index_type: rebuild from a writable copy
+            self.embeddings = np.array(self.embeddings)
+            self._build_index()
+        self.initialize_model()
 
-        with open(path, 'rb') as f:
+        print("Embeddings loaded successfully!")
+
+    def _load_legacy_pickle(self, paths: Dict[str, str]):
+        print(f"Loading legacy embeddings pickle from {paths['legacy']}")
+        with open(paths['legacy'], 'rb') as f:
             save_data = pickle.load(f)
 
-        self.embeddings = save_data['embeddings']
+        self.embeddings = np.ascontiguousarray(save_data['embeddings'], dtype=np.float32)
+        self.content_hashes = None
         self.model_name = save_data['model_name']
+        if self.index_type == 'auto':
+            self.index_type = save_data.get('index_type', 'auto')
         self.data = save_data['data']
-
-        index_path = path.replace('.pkl', '_index.pkl')
-        with open(index_path, 'rb') as f:
-            self.nn_index = pickle.load(f)
-        self.initialize_model()
-
-        print("Embeddings loaded successfully!")
+        self._cast_integer_columns()
+        if 'Answer_Text' not in self.data.columns:
+            self._add_derived_columns()
+        self._materialize_result_columns()
+
+        # Any <base>_index.pkl is ignored: it only wraps this same matrix (and unpickling a fitted sklearn
+        # index needs a matching sklearn install), so the index is rebuilt from the embeddings instead
+        self._build_index()
+
+    @staticmethod
+    def _top_k(similarities: np.ndarray, k: int):
+        # argpartition is O(n) per row; only the k survivors get sorted
+        k = min(k, similarities.shape[1])
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(similarities, top, axis=1), axis=1)
+        indices = np.take_along_axis(top, order, axis=1)
+        return np.take_along_axis(similarities, indices, axis=1), indices
+
+    # Both brute-force paths rely on rows (and queries) being L2-normalized once up front, so cosine
+    # similarity is a plain dot product and no norms are recomputed per query.
+
+    # simsimd.cdist is single-threaded unless told otherwise; the int8 / fp16 scans have no BLAS alternative
+    SIMD_THREADS = os.cpu_count() or 1
+
+    def _simd_search(self, query_embeddings: np.ndarray, k: int):
+        similarities = np.asarray(simsimd.cdist(query_embeddings, self.embeddings, metric='dot'), dtype=np.float32)
+        return self._top_k(similarities, k)
+
+    def _matmul_search(self, query_embeddings: np.ndarray, k: int):
+        if len(query_embeddings) == 1:
+            # Single query: one SGEMV streaming the row-major matrix once
+            return self._top_k((self.embeddings @ query_embeddings[0])[None, :], k)
+        return self._top_k(query_embeddings @ self.embeddings.T, k)
+
+    def _int8_search(self, query_embeddings: np.ndarray, k: int):
+        # Codes are not unit-norm, so score with cosine rather than dot
+        distances = simsimd.cdist(self._quantize_int8(query_embeddings), self.embeddings_i8, metric='cosine',
+                                  threads=self.SIMD_THREADS)
+        return self._top_k(1 - np.asarray(distances, dtype=np.float32), k)
+
+    # Rows per fp16 -> fp32 cast in the NumPy fallback: bounds the temporary float32 copy
+    FP16_BLOCK_ROWS = 16_384
+
+    def _fp16_search(self, query_embeddings: np.ndarray, k: int):
+        if simsimd is not None:
+            # SimSIMD reads the fp16 rows directly and accumulates in fp32
+            similarities = simsimd.cdist(query_embeddings.astype(np.float16), self.embeddings_f16, metric='dot',
+                                         threads=self.SIMD_THREADS)
+            return self._top_k(np.asarray(similarities, dtype=np.float32), k)
+        similarities = np.concatenate([
+            query_embeddings @ self.embeddings_f16[start:start + self.FP16_BLOCK_ROWS].astype(np.float32).T
+            for start in range(0, len(self.embeddings_f16), self.FP16_BLOCK_ROWS)
+        ], axis=1)
+        return self._top_k(similarities, k)
+
+    def _hnswlib_search(self, query_embeddings: np.ndarray, k: int):
+        k = min(k, self.hnsw_index.get_current_count())
+        # ef must be >= k; only ever raised so concurrent searches never see it shrink
+        if self.hnsw_index.ef < k:
+            self.hnsw_index.set_ef(k)
+        labels, distances = self.hnsw_index.knn_query(query_embeddings, k=k)
+        return 1 - distances, labels.astype(np.int64)
+
+    def _pruned_search(self, query_embeddings: np.ndarray, k: int):
+        return topk_pruned(self.embeddings, self.tail_norms, query_embeddings, min(k, len(self.embeddings)))
+
+    def _knn(self, query_embeddings: np.ndarray, k: int):
+        """Return (similarities, indices) of shape (n_queries, k) for normalized query embeddings."""
+        if self.embeddings_i8 is not None:
+            return self._int8_search(query_embeddings, k)
+        if self.nn_index is not None:
+            return self.nn_index.search(query_embeddings, min(k, self.nn_index.ntotal))
+        if self.hnsw_index is not None:
+            return self._hnswlib_search(query_embeddings, k)
+        if self.embeddings_f16 is not None:
+            return self._fp16_search(query_embeddings, k)
+        if self.tail_norms is not None:
+            return self._pruned_search(query_embeddings, k)
+        if self.index_type == 'jit':
+            return topk_dot(self.embeddings, query_embeddings, min(k, len(self.embeddings)))
+        if simsimd is not None and len(query_embeddings) == 1:
+            # SimSIMD beats SGEMV for one query; batches (evaluator, /search/batch, micro-batches) go to one
+            # multithreaded GEMM, which is several times faster than cdist there
+            return self._simd_search(query_embeddings, k)
+        return self._matmul_search(query_embeddings, k)
+
+    def _encode_queries(self, queries_cleaned: List[str], batch_size: int = 32,
+                        show_progress_bar: bool = False) -> np.ndarray:
+        embeddings = self.model.encode(queries_cleaned, batch_size=batch_size, show_progress_bar=show_progress_bar)
+        return self._normalize_l2(np.ascontiguousarray(embeddings, dtype=np.float32))
+
+    def clear_query_cache(self):
+        with self._query_cache_lock:
+            self._query_cache.clear()
+
+    def _encode_queries_cached(self, queries_cleaned: List[str], batch_size: int = 32) -> np.ndarray:
+        """_encode_queries for distinct queries, serving repeats from the embedding LRU."""
+        if self.query_cache_size <= 0:
+            return self._encode_queries(queries_cleaned, batch_size=batch_size)
+        embeddings: List[Optional[np.ndarray]] = [None] * len(queries_cleaned)
+        with self._query_cache_lock:
+            for i, query_cleaned in enumerate(queries_cleaned):
+                cached = self._embedding_cache.get(query_cleaned)
+                if cached is not None:
+                    self._embedding_cache.move_to_end(query_cleaned)
+                    embeddings[i] = cached
+
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if misses:
+            encoded = self._encode_queries([queries_cleaned[i] for i in misses], batch_size=batch_size)
+            with self._query_cache_lock:
+                for row, i in enumerate(misses):
+                    # Copy each row so the cache never pins the whole batch matrix
+                    embeddings[i] = encoded[row].copy()
+                    self._embedding_cache[queries_cleaned[i]] = embeddings[i]
+                    self._embedding_cache.move_to_end(queries_cleaned[i])
+                while len(self._embedding_cache) > self.query_cache_size:
+                    self._embedding_cache.popitem(last=False)
+        return np.ascontiguousarray(np.stack(embeddings), dtype=np.float32)
+
+    def _encode_and_search(self, queries_cleaned: List[str], k: int, batch_size: int = 32) -> List[Tuple[tuple, tuple]]:
+        """(indices, similarities) per cleaned query; cache misses share one encoder pass and one k-NN call."""
+        hits: List[Optional[Tuple[tuple, tuple]]] = [None] * len(queries_cleaned)
+        with self._query_cache_lock:
+            for i, query_cleaned in enumerate(queries_cleaned):
+                key = (query_cleaned, k)
+                cached = self._query_cache.get(key)
+                if cached is not None:
+                    self._query_cache.move_to_end(key)
+                    hits[i] = cached
+
+        misses = [i for i, hit in enumerate(hits) if hit is None]
+        if misses:
+            # Duplicates within a batch (e.g. concurrent identical requests) are encoded and searched once.
+            # No length sorting here: model.encode already orders each call by length to minimise padding.
+            unique_queries = list(dict.fromkeys(queries_cleaned[i] for i in misses))
+            rows = {query: row for row, query in enumerate(unique_queries)}
+            query_embeddings = self._encode_queries_cached(unique_queries, batch_size=batch_size)
+            similarities, indices = self._knn(query_embeddings, k)
+            for i in misses:
+                row = rows[queries_cleaned[i]]
+                # Plain tuples: hashable-friendly and immune to callers mutating a shared ndarray
+                hits[i] = (tuple(int(j) for j in indices[row]), tuple(float(v) for v in similarities[row]))
+
+            if self.query_cache_size > 0:
+                with self._query_cache_lock:
+                    for i in misses:
+                        key = (queries_cleaned[i], k)
+                        self._query_cache[key] = hits[i]
+                        self._query_cache.move_to_end(key)
+                    while len(self._query_cache) > self.query_cache_size:
+                        self._query_cache.popitem(last=False)
+        return hits
+
+    def retrieve_indices(self, queries: List[str], k: int = 5, batch_size: int = 64,
+                         show_progress_bar: bool = False):
+        """Encode all queries in one batched forward pass and run a single k-NN search.
+
+        Returns (similarities, indices) arrays of shape (len(queries), k) with row
+        positions into ``self.data``; approximate indexes pad missing hits with -1.
+        """
+        if self.embeddings is None or self.model is None:
+            raise ValueError("System not initialized. Please load data and compute embeddings first.")
+        query_embeddings = self._encode_queries(self._clean_series(pd.Series(queries, dtype=object)).tolist(),
+                                                batch_size=batch_size, show_progress_bar=show_progress_bar)
+        return self._knn(query_embeddings, k)
 
     def search(self, query: str, k: int = 5) -> List[Dict]:
-        if self.nn_index is None or self.model is None:
+        if self.embeddings is None or self.model is None:
             raise ValueError("System not initialized. Please load data and compute embeddings first.")
 
-        query_cleaned = self._clean_text(query)
-        query_embedding = self.model.encode([query_cleaned])
-        distances, indices = self.nn_index.kneighbors(query_embedding, n_neighbors=k)
-        results: List[Dict] = []
-        for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-            row = self.data.iloc[idx]
-            similarity = 1 - distance
-
-            def _none_if_nan(value):
-                try:
-                    return None if pd.isna(value) else value
-                except Exception:
-                    return value
-
-            def _get_answer_text(answer_value, row_obj) -> Optional[str]:
-                answer_clean = _none_if_nan(answer_value)
-                if answer_clean is None:
-                    return None
-                try:
-                    # Try numeric mapping to option columns
-                    answer_num = int(str(answer_clean).strip())
-                    if 1 <= answer_num <= 5:
-                        opt_key = f"Option {answer_num}"
-                        return _none_if_nan(row_obj[opt_key])
-                except Exception:
-                    pass
-                # If not numeric, try exact match to any option text
-                for n in range(1, 6):
-                    opt_val = _none_if_nan(row_obj.get(f"Option {n}"))
-                    if opt_val is not None and str(opt_val).strip() == str(answer_clean).strip():
-                        return str(opt_val)
-                # Fallback to original answer field as text
-                return str(answer_clean)
-
-            result = {
-                'rank': i + 1,
-                'id': int(row['ID']) if _none_if_nan(row['ID']) is not None else None,
-                'question_id': int(row['Question ID']) if _none_if_nan(row['Question ID']) is not None else None,
-                'question': _none_if_nan(row['Question']),
-                'question_cleaned': _none_if_nan(row['Question_Cleaned']),
-                'option_1': _none_if_nan(row['Option 1']),
-                'option_2': _none_if_nan(row['Option 2']),
-                'option_3': _none_if_nan(row['Option 3']),
-                'option_4': _none_if_nan(row['Option 4']),
-                'option_5': _none_if_nan(row['Option 5']),
-                'answer': _none_if_nan(row['Answer']),
-                'answer_text': _get_answer_text(row['Answer'], row),
-                'explanation': _none_if_nan(row['Explain']),
-                'difficulty': int(row['Difficulty']) if _none_if_nan(row['Difficulty']) is not None else None,
-                'similarity_score': float(similarity),
-                'distance': float(distance)
-            }
-            results.append(result)
+        indices, similarities = self._encode_and_search([self._clean_text(query)], k)[0]
+        return self._format_results(similarities, indices)
 
+    def search_batch(self, queries: List[str], k: int = 5, batch_size: int = 32) -> List[List[Dict]]:
+        """Search several queries with one shared embedding forward pass; one result list per query."""
+        if self.embeddings is None or self.model is None:
+            raise ValueError("System not initialized. Please load data and compute embeddings first.")
+        queries_cleaned = self._clean_series(pd.Series(queries, dtype=object)).tolist()
+        hits = self._encode_and_search(queries_cleaned, k, batch_size=batch_size)
+        return [self._format_results(similarities, indices) for indices, similarities in hits]
+
+    # DataFrame column -> key in the search result dicts
+    RESULT_FIELDS = {
+        'ID': 'id', 'Question ID': 'question_id', 'Question': 'question', 'Question_Cleaned': 'question_cleaned',
+        'Option 1': 'option_1', 'Option 2': 'option_2', 'Option 3': 'option_3', 'Option 4': 'option_4',
+        'Option 5': 'option_5', 'Answer': 'answer', 'Answer_Text': 'answer_text', 'Explain': 'explanation',
+        'Difficulty': 'difficulty',
+    }
+
+    def _format_results(self, similarities, indices) -> List[Dict]:
+        results: List[Dict] = []
+        for similarity, idx in zip(np.asarray(similarities, dtype=np.float64).tolist(),
+                                   np.asarray(indices, dtype=np.int64).tolist()):
+            # Approximate indexes pad with -1 when fewer than k neighbours are found
+            if idx < 0:
+                continue
+            hit = {'rank': len(results) + 1}
+            for key, values in self._result_columns:
+                hit[key] = values[idx]
+            hit['similarity_score'] = similarity
+            hit['distance'] = 1 - similarity
+            results.append(hit)
         return results
 
     def get_stats(self) -> Dict:
         return {
             'total_questions': len(self.data) if self.data is not None else 0,
             'model_name': self.model_name,
+            'index_type': self._resolve_index_type(len(self.data)) if self.data is not None else self.index_type,
             'embedding_dimension': self.embeddings.shape[1] if self.embeddings is not None else None,
             'has_embeddings': self.embeddings is not None,
-            'has_index': self.nn_index is not None
+            # Embeddings are only set by compute_embeddings / load_embeddings, which always leave _knn a usable
+            # path: a built index, quantized codes, or a direct scan of the normalized matrix
+            'has_index': self.embeddings is not None
         }
 
     def bm25_search(self, query: str, k: int = 5) -> list:
         if not hasattr(self, 'bm25'):
             self.bm25 = BM25Okapi(self.questions_cleaned)
         scores = self.bm25.get_scores(query)
-        top_indices = np.argsort(scores)[::-1][:k]
-        results = []
-        for i, idx in enumerate(top_indices):
-            row = self.data.iloc[idx]
-            results.append({
+        top_scores, top_indices = self._top_k(np.asarray(scores)[None, :], k)
+        top_scores, top_indices = top_scores[0], top_indices[0]
+        # Column arrays sliced once instead of a row Series per hit
+        rows = self.data.iloc[top_indices]
+        ids = rows['ID'].astype(object).where(rows['ID'].notna(), None).tolist()
+        explanations = rows['Explain'].tolist() if 'Explain' in rows.columns else [None] * len(rows)
+        return [
+            {
                 'rank': i + 1,
-                'id': int(row['ID']) if not pd.isna(row['ID']) else None,
-                'question': row['Question'],
-                'score': float(scores[idx]),
-                'explanation': row.get('Explain', None),
-            })
-        return results
+                'id': id_,
+                'question': question,
+                'score': float(score),
+                'explanation': explanation,
+            }
+            for i, (score, id_, question, explanation)
+            in enumerate(zip(top_scores, ids, rows['Question'].tolist(), explanations))
+        ]
 
     def rerank_with_cross_encoder(self, query: str, candidates: list) -> list:
         cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
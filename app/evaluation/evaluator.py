@@ -17,28 +17,21 @@ class RAGEvaluator:
         _, test_indices = train_test_split(all_indices, test_size=test_size, random_state=random_state)
         print(f"Using {len(test_indices)} questions for evaluation")
 
-        hit_at_1 = 0
-        hit_at_3 = 0
-        hit_at_5 = 0
-        reciprocal_ranks: List[float] = []
-
-        for i, test_idx in enumerate(test_indices):
-            if i % 10 == 0:
-                print(f"Evaluating question {i+1}/{len(test_indices)}")
-            query = all_questions[test_idx]
-            results = self.rag_system.search(query, k=20)
-            ranks = [r['rank'] for r in results if r['id'] == self.rag_system.data.iloc[test_idx]['ID']]
-            if ranks:
-                rank = ranks[0]
-                if rank <= 1:
-                    hit_at_1 += 1
-                if rank <= 3:
-                    hit_at_3 += 1
-                if rank <= 5:
-                    hit_at_5 += 1
-                reciprocal_ranks.append(1.0 / rank)
-            else:
-                reciprocal_ranks.append(0.0)
+        queries = [all_questions[i] for i in test_indices]
+        _, retrieved = self.rag_system.retrieve_indices(queries, k=20, batch_size=64, show_progress_bar=True)
+        # float with NaN for missing IDs: NaN never equals anything, so ID-less rows can't count as hits
+        all_ids = self.rag_system.data['ID'].to_numpy(dtype=np.float64, na_value=np.nan)
+        truth_ids = all_ids[test_indices]
+
+        # (N, 20) match mask -> 1-based rank of the first hit, 0 when the question was not retrieved
+        matches = (retrieved >= 0) & (all_ids[retrieved] == truth_ids[:, None])
+        ranks = np.where(matches.any(axis=1), matches.argmax(axis=1) + 1, 0)
+        found = ranks > 0
+        reciprocal_ranks = np.where(found, 1.0 / np.maximum(ranks, 1), 0.0)
+
+        hit_at_1 = int((found & (ranks <= 1)).sum())
+        hit_at_3 = int((found & (ranks <= 3)).sum())
+        hit_at_5 = int((found & (ranks <= 5)).sum())
 
         total_questions = len(test_indices)
         hit_at_1_score = hit_at_1 / total_questions
@@ -55,7 +48,7 @@ class RAGEvaluator:
             'hit_at_1_count': hit_at_1,
             'hit_at_3_count': hit_at_3,
             'hit_at_5_count': hit_at_5,
-            'reciprocal_ranks': reciprocal_ranks
+            'reciprocal_ranks': reciprocal_ranks.tolist()
         }
 
         return self.results
@@ -113,6 +106,3 @@ class RAGEvaluator:
             print(f"- Questions not found in top 20: {sum(1 for rr in self.results['reciprocal_ranks'] if rr == 0)}")
 
         print("\n" + "="*60)
-
-
-``
\ No newline at end of file
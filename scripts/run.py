@@ -5,26 +5,30 @@ from app.core import BengaliRAGSystem
 from app.evaluation import RAGEvaluator
 
 
-def initialize_system():
+def initialize_system(rebuild=False):
     print(" Initializing Bengali RAG System...")
     if not os.path.exists('questions.csv'):
         print(" Error: questions.csv not found!")
         return None
     rag = BengaliRAGSystem()
     rag.load_data('questions.csv')
-    if os.path.exists('embeddings.pkl'):
+    if rebuild:
+        # Rows whose text is unchanged reuse their saved vectors; only new or edited questions are encoded
+        print(" Rebuilding embeddings from questions.csv...")
+        rag.compute_embeddings('embeddings')
+    elif BengaliRAGSystem.saved_embeddings_exist('embeddings'):
         print(" Loading existing embeddings...")
-        rag.load_embeddings('embeddings.pkl')
+        rag.load_embeddings('embeddings')
     else:
         print(" Computing new embeddings...")
-        rag.compute_embeddings('embeddings.pkl')
+        rag.compute_embeddings('embeddings')
     print(" System initialized successfully!")
     return rag
 
 
-def run_evaluation():
+def run_evaluation(rebuild=False):
     print("\n Running evaluation...")
-    rag = initialize_system()
+    rag = initialize_system(rebuild)
     if rag is None:
         return
     evaluator = RAGEvaluator(rag)
@@ -47,10 +51,10 @@ def run_evaluation():
         json.dump({'metrics': results, 'examples': examples}, f, ensure_ascii=False, indent=2)
 
 
-def run_api_server(host="0.0.0.0", port=8000):
-    print(f"\n Starting API server on {host}:{port}...")
+def run_api_server(host="0.0.0.0", port=8000, workers=1):
+    print(f"\n Starting API server on {host}:{port} with {workers} worker(s)...")
     try:
-        uvicorn.run("app.api.server:app", host=host, port=port, reload=False)
+        uvicorn.run("app.api.server:app", host=host, port=port, reload=False, workers=workers)
     except KeyboardInterrupt:
         print("\n Server stopped by user")
     except Exception as e:
@@ -93,17 +97,20 @@ def main():
     parser.add_argument("--mode", choices=["api", "eval", "search", "init"], default="api", help="Mode to run the system")
     parser.add_argument("--host", default="0.0.0.0", help="Host for API server")
     parser.add_argument("--port", type=int, default=8000, help="Port for API server")
+    parser.add_argument("--workers", type=int, default=1, help="Number of API server worker processes")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Re-embed questions.csv (init/eval), reusing saved vectors for unchanged rows")
     args = parser.parse_args()
     if args.mode == "init":
-        rag = initialize_system()
+        rag = initialize_system(args.rebuild)
         if rag:
             print(f"System ready! Stats: {rag.get_stats()}")
     elif args.mode == "eval":
-        run_evaluation()
+        run_evaluation(args.rebuild)
     elif args.mode == "search":
         interactive_search()
     elif args.mode == "api":
-        run_api_server(args.host, args.port)
+        run_api_server(args.host, args.port, args.workers)
     else:
         print(" Invalid mode specified")
 
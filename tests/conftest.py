@@ -0,0 +1,79 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import BengaliRAGSystem
+
+
+class FakeEncoder:
+    """Deterministic stand-in for SentenceTransformer: each text maps to a fixed pseudo-random vector."""
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.encoded = []
+        self.pools = []
+        self.pool_encoded = []
+        self.stopped_pools = 0
+
+    def start_multi_process_pool(self, target_devices=None):
+        pool = {'devices': list(target_devices)}
+        self.pools.append(pool)
+        return pool
+
+    def stop_multi_process_pool(self, pool):
+        self.pools.remove(pool)
+        self.stopped_pools += 1
+
+    def vector(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+        return np.random.default_rng(seed).normal(size=self.dim).astype(np.float32)
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True, pool=None):
+        texts = list(texts)
+        self.encoded.append(texts)
+        if pool is not None:
+            assert pool in self.pools, 'encode() called with a pool that is not running'
+            self.pool_encoded.append(len(texts))
+        return np.stack([self.vector(t) for t in texts]) if texts else np.empty((0, self.dim), np.float32)
+
+
+def make_frame(n):
+    return pd.DataFrame({
+        'ID': range(1, n + 1),
+        'Question ID': range(101, n + 101),
+        'Question': [f'প্রশ্ন {i}' for i in range(n)],
+        'Option 1': ['ক'] * n, 'Option 2': ['খ'] * n, 'Option 3': ['গ'] * n,
+        'Option 4': ['ঘ'] * n, 'Option 5': [None] * n,
+        'Answer': ['2' if i % 3 else 'খ' for i in range(n)],
+        'Explain': [f'ব্যাখ্যা {i}' if i % 2 else None for i in range(n)],
+        'Difficulty': [1] * n,
+    })
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    fake = FakeEncoder()
+
+    def initialize_model(self):
+        self.device = 'cpu'
+        self.model = fake
+
+    monkeypatch.setattr(BengaliRAGSystem, 'initialize_model', initialize_model)
+    return fake
+
+
+@pytest.fixture
+def build_rag(tmp_path, encoder):
+    """build_rag(index_type, n) -> system with data loaded and embeddings computed (and saved) from the fake encoder."""
+
+    def build(index_type='auto', n=200, save=True, **kwargs):
+        csv = tmp_path / 'questions.csv'
+        make_frame(n).to_csv(csv, index=False)
+        rag = BengaliRAGSystem(index_type=index_type, **kwargs)
+        rag.load_data(str(csv))
+        rag.compute_embeddings(str(tmp_path / 'embeddings') if save else None)
+        return rag
+
+    return build
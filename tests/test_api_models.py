@@ -0,0 +1,25 @@
+import pytest
+from pydantic import ValidationError
+
+from app.api.server import ChatRequest
+
+
+@pytest.mark.parametrize('k', [None, 0, 51])
+def test_chat_request_rejects_invalid_k(k):
+    with pytest.raises(ValidationError):
+        ChatRequest(message='প্রশ্ন', k=k)
+
+
+def test_chat_request_default_k():
+    assert ChatRequest(message='প্রশ্ন').k == 3
+
+
+def test_search_result_accepts_hits_with_missing_ids(tmp_path, build_rag):
+    from app.api.server import SearchResponse
+    rag = build_rag('brute', n=10, save=False)
+    rag.data.loc[rag.data.index[0], ['ID', 'Question ID']] = None
+    rag._materialize_result_columns()
+
+    results = rag._format_results([0.9], [0])
+    assert results[0]['id'] is None and results[0]['question_id'] is None
+    SearchResponse(query='q', results=results, total_results=1, system_stats={})
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from app.api.batching import QueryBatcher
+
+
+class FakeRAG:
+    """Records each search_batch call and returns one hit per rank, named after the query."""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+
+    def search_batch(self, queries, k=5):
+        self.calls.append((list(queries), k))
+        if self.fail_on in queries:
+            raise RuntimeError("encoder failed")
+        return [[{'rank': r, 'query': q} for r in range(1, k + 1)] for q in queries]
+
+
+async def _gather(batcher, requests):
+    batcher.start()
+    try:
+        return await asyncio.gather(*(batcher.search(q, k) for q, k in requests), return_exceptions=True)
+    finally:
+        await batcher.stop()
+
+
+def test_mixed_k_batch_runs_once_at_max_k():
+    rag = FakeRAG()
+    batcher = QueryBatcher(rag, max_batch=8, max_wait_ms=50)
+    results = asyncio.run(_gather(batcher, [('a', 2), ('b', 5), ('c', 3)]))
+
+    assert rag.calls == [(['a', 'b', 'c'], 5)]
+    assert [len(r) for r in results] == [2, 5, 3]
+    assert all(hit['query'] == q for r, q in zip(results, 'abc') for hit in r)
+
+
+def test_failed_batch_only_fails_its_own_requests():
+    async def scenario():
+        rag = FakeRAG(fail_on='bad')
+        batcher = QueryBatcher(rag, max_batch=8, max_wait_ms=20)
+        batcher.start()
+        try:
+            first = await asyncio.gather(batcher.search('bad', 3), batcher.search('ok', 3), return_exceptions=True)
+            # A k that cannot be compared must not kill the background task either
+            second = await asyncio.gather(batcher.search('x', None), batcher.search('y', 2), return_exceptions=True)
+            third = await batcher.search('later', 1)
+        finally:
+            await batcher.stop()
+        return first, second, third
+
+    # Bounded: a dead batcher task would otherwise leave the futures pending forever
+    first, second, third = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert all(isinstance(r, RuntimeError) for r in first)
+    assert all(isinstance(r, TypeError) for r in second)
+    assert third == [{'rank': 1, 'query': 'later'}]
+
+
+def test_search_before_start_raises():
+    batcher = QueryBatcher(FakeRAG())
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.search('q'))
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from app.evaluation import RAGEvaluator
+
+
+def _loop_metrics(ids, test_indices, retrieved):
+    # The per-question loop the vectorized evaluator replaced
+    hits = {1: 0, 3: 0, 5: 0}
+    reciprocal_ranks = []
+    for test_idx, row_indices in zip(test_indices, retrieved):
+        row_indices = row_indices[row_indices >= 0]
+        truth = ids[test_idx]
+        if pd.isna(truth):
+            reciprocal_ranks.append(0.0)
+            continue
+        ranks = [r + 1 for r, j in enumerate(row_indices) if not pd.isna(ids[j]) and ids[j] == truth]
+        if ranks:
+            for k in hits:
+                hits[k] += ranks[0] <= k
+            reciprocal_ranks.append(1.0 / ranks[0])
+        else:
+            reciprocal_ranks.append(0.0)
+    return hits, reciprocal_ranks
+
+
+def test_vectorized_ranks_match_the_per_question_loop(build_rag, monkeypatch):
+    rag = build_rag('brute', n=300, save=False)
+    _, test_indices = train_test_split(list(range(len(rag.data))), test_size=0.2, random_state=42)
+    # A missing ID must never count as a hit, and a duplicated ID counts wherever it appears first
+    rag.data['ID'] = rag.data['ID'].astype('Int64')
+    rag.data.loc[rag.data.index[test_indices[0]], 'ID'] = pd.NA
+    rag.data.loc[rag.data.index[test_indices[1]], 'ID'] = rag.data['ID'].iloc[test_indices[2]]
+    ids = rag.data['ID'].tolist()
+
+    rng = np.random.default_rng(0)
+    retrieved = np.stack([rng.permutation(len(ids))[:20] for _ in test_indices])
+    # Plant the true row at varied ranks (or not at all) and pad some rows like an approximate index would
+    for row, test_idx in enumerate(test_indices):
+        retrieved[row][retrieved[row] == test_idx] = (test_idx + 1) % len(ids)
+        rank = row % 25
+        if rank < 20:
+            retrieved[row, rank] = test_idx
+        if row % 4 == 0:
+            retrieved[row, 15 + row % 5:] = -1
+    # Row 1 ranks its ID-twin (row 2's question) ahead of itself
+    retrieved[1, 0] = test_indices[2]
+    monkeypatch.setattr(rag, 'retrieve_indices', lambda queries, **kwargs: (None, retrieved))
+
+    results = RAGEvaluator(rag).evaluate_retrieval_metrics()
+    hits, reciprocal_ranks = _loop_metrics(ids, test_indices, retrieved)
+
+    assert [results[f'hit_at_{k}_count'] for k in (1, 3, 5)] == [hits[1], hits[3], hits[5]]
+    assert results['hit_at_5'] == hits[5] / len(test_indices)
+    np.testing.assert_allclose(results['reciprocal_ranks'], reciprocal_ranks)
+    assert results['mrr'] == np.mean(reciprocal_ranks)
+    # The planted edge cases: the ID-less question is a miss even though its row was retrieved first
+    assert results['reciprocal_ranks'][:2] == [0.0, 1.0]
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('numba')
+
+from app.core.kernels import tail_norms, topk_dot, topk_pruned
+
+
+def _normalized(rng, n, dim):
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _reference(embeddings, queries, k):
+    similarities = queries @ embeddings.T
+    indices = np.argsort(-similarities, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(similarities, indices, axis=1), indices
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    # Clustered rows so the pruned scan actually skips some of them
+    centers = _normalized(rng, 8, 96)
+    embeddings = centers[rng.integers(0, 8, 2000)] + 0.2 * rng.normal(size=(2000, 96)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = _normalized(rng, 5, 96)
+    return embeddings.astype(np.float32), queries
+
+
+def _pruned(embeddings, queries, k):
+    return topk_pruned(embeddings, tail_norms(embeddings), queries, k)
+
+
+@pytest.mark.parametrize('search', [topk_dot, _pruned])
+@pytest.mark.parametrize('k', [1, 10])
+def test_matches_full_sort(data, search, k):
+    embeddings, queries = data
+    similarities, indices = search(embeddings, queries, k)
+    ref_similarities, ref_indices = _reference(embeddings, queries, k)
+
+    np.testing.assert_array_equal(indices, ref_indices)
+    np.testing.assert_allclose(similarities, ref_similarities, atol=1e-5)
+
+
+@pytest.mark.parametrize('search', [topk_dot, _pruned])
+def test_k_larger_than_corpus_pads(data, search):
+    embeddings, queries = data
+    similarities, indices = search(embeddings[:3], queries, 5)
+
+    np.testing.assert_array_equal(indices[:, :3], _reference(embeddings[:3], queries, 3)[1])
+    assert (indices[:, 3:] == -1).all()
+    assert np.isneginf(similarities[:, 3:]).all()
+
+
+@pytest.mark.parametrize('search', [topk_dot, _pruned])
+def test_read_only_memmap(tmp_path, data, search):
+    embeddings, queries = data
+    np.save(tmp_path / 'emb.npy', embeddings)
+    mapped = np.load(tmp_path / 'emb.npy', mmap_mode='r')
+
+    _, indices = search(mapped, queries, 5)
+    np.testing.assert_array_equal(indices, _reference(embeddings, queries, 5)[1])
@@ -0,0 +1,319 @@
+import json
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import BengaliRAGSystem
+
+
+def _save_artifacts(base, texts, meta):
+    embeddings = np.arange(len(texts) * 4, dtype=np.float32).reshape(len(texts), 4)
+    np.save(f'{base}.npy', embeddings)
+    np.save(f'{base}.hashes.npy', BengaliRAGSystem._content_hashes(texts))
+    with open(f'{base}.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return embeddings
+
+
+@pytest.fixture
+def saved(tmp_path):
+    base = str(tmp_path / 'embeddings')
+    rag = BengaliRAGSystem(backend='torch')
+    meta = {'model_name': rag.model_name, 'backend': 'torch', 'backend_file': None}
+    return base, _save_artifacts(base, ['ক', 'খ', 'গ'], meta)
+
+
+def test_reuses_rows_by_content_hash(saved):
+    base, old = saved
+    rag = BengaliRAGSystem(backend='torch')
+    texts = ['গ', 'নতুন', 'ক']
+    embeddings, reused = rag._reusable_embeddings(base, rag._content_hashes(texts))
+
+    np.testing.assert_array_equal(reused, [True, False, True])
+    np.testing.assert_array_equal(embeddings[[0, 2]], old[[2, 0]])
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'backend': 'onnx'},
+    {'backend': 'onnx', 'backend_file': 'onnx/model_qint8_avx512_vnni.onnx'},
+    {'backend': 'torch', 'model_name': 'sentence-transformers/all-MiniLM-L6-v2'},
+])
+def test_no_reuse_across_models_or_backends(saved, kwargs):
+    base, _ = saved
+    rag = BengaliRAGSystem(**kwargs)
+    assert rag._reusable_embeddings(base, rag._content_hashes(['ক'])) == (None, None)
+
+
+def _reference(rag, queries, k):
+    # Exact baseline: full sort of the plain matmul over the normalized matrix
+    embeddings = np.asarray(rag.embeddings, dtype=np.float32)
+    query_embeddings = rag._normalize_l2(np.stack([rag.model.vector(q) for q in queries]))
+    similarities = query_embeddings @ embeddings.T
+    return np.argsort(-similarities, axis=1, kind='stable')[:, :k]
+
+
+def test_flat_index_round_trips_through_faiss(tmp_path, build_rag):
+    faiss = pytest.importorskip('faiss')
+    rag = build_rag('flat')
+    assert isinstance(rag.nn_index, faiss.IndexFlatIP)
+
+    loaded = BengaliRAGSystem(index_type='flat')
+    loaded.load_embeddings(str(tmp_path / 'embeddings'))
+    assert loaded.nn_index is not None and loaded.nn_index.ntotal == 200
+
+    queries = ['প্রশ্ন 3', 'অন্য কিছু']
+    _, indices = loaded.retrieve_indices(queries, k=5)
+    np.testing.assert_array_equal(indices, _reference(loaded, queries, 5))
+
+
+def test_brute_scans_the_matrix_without_an_index_object(tmp_path, build_rag):
+    rag = build_rag('brute')
+    assert rag.nn_index is None
+    assert rag.get_stats()['has_index'] is True
+
+    loaded = BengaliRAGSystem(index_type='brute')
+    loaded.load_embeddings(str(tmp_path / 'embeddings'))
+    assert loaded.nn_index is None and isinstance(loaded.embeddings, np.memmap)
+
+    queries = ['প্রশ্ন 7', 'প্রশ্ন 8']
+    _, indices = loaded.retrieve_indices(queries, k=5)
+    np.testing.assert_array_equal(indices, _reference(loaded, queries, 5))
+
+
+def test_simd_single_query_matches_matmul(build_rag):
+    pytest.importorskip('simsimd')
+    rag = build_rag('brute', save=False)
+    query = rag._encode_queries(['প্রশ্ন 11'])
+    simd_similarities, simd_indices = rag._simd_search(query, 10)
+    matmul_similarities, matmul_indices = rag._matmul_search(query, 10)
+
+    np.testing.assert_array_equal(simd_indices, matmul_indices)
+    np.testing.assert_allclose(simd_similarities, matmul_similarities, atol=1e-5)
+
+
+def test_brute_batches_use_matmul(build_rag, monkeypatch):
+    rag = build_rag('brute', save=False)
+    monkeypatch.setattr(rag, '_simd_search', lambda *args: pytest.fail('batched query routed to simsimd'))
+    queries = ['প্রশ্ন 1', 'প্রশ্ন 2', 'প্রশ্ন 3']
+    _, indices = rag.retrieve_indices(queries, k=5)
+    np.testing.assert_array_equal(indices, _reference(rag, queries, 5))
+
+
+def test_load_adopts_the_saved_backend(tmp_path, build_rag):
+    build_rag('brute', backend='onnx')
+    loaded = BengaliRAGSystem(index_type='brute', backend='torch')
+    loaded.load_embeddings(str(tmp_path / 'embeddings'))
+    assert loaded.backend == 'onnx'
+
+
+def test_load_adopts_the_saved_backend_file(tmp_path, build_rag):
+    build_rag('brute', backend='onnx', backend_file='onnx/model_qint8_avx512_vnni.onnx')
+    loaded = BengaliRAGSystem(index_type='brute', backend='onnx')
+    loaded.load_embeddings(str(tmp_path / 'embeddings'))
+    assert loaded.backend_file == 'onnx/model_qint8_avx512_vnni.onnx'
+
+    build_rag('brute', backend='onnx')
+    loaded = BengaliRAGSystem(index_type='brute', backend='onnx', backend_file='onnx/model_qint8_avx512_vnni.onnx')
+    loaded.load_embeddings(str(tmp_path / 'embeddings'))
+    assert loaded.backend_file is None
+
+
+@pytest.mark.parametrize('dim, expected', [(384, 48), (64, 32), (768, 48), (100, 25), (97, 1)])
+def test_pq_subquantizers_divide_dim(dim, expected):
+    assert BengaliRAGSystem._pq_subquantizers(dim) == expected
+
+
+def test_ivfpq_falls_back_to_flat_when_too_small(build_rag):
+    faiss = pytest.importorskip('faiss')
+    rag = build_rag('ivfpq', save=False)
+    assert isinstance(rag.nn_index, faiss.IndexFlatIP)
+
+
+def test_ivfpq_trains_on_non_multiple_of_48_dim():
+    faiss = pytest.importorskip('faiss')
+    rag = BengaliRAGSystem(index_type='ivfpq')
+    # Below faiss's recommended training size (it only warns) to keep the test fast
+    rag.IVFPQ_MIN_POINTS_PER_CENTROID = 1
+    rag.embeddings = np.random.default_rng(0).normal(size=(2_000, 64)).astype(np.float32)
+    rag._build_index()
+    assert isinstance(rag.nn_index, faiss.IndexIVFPQ)
+    assert rag.nn_index.pq.M == 32
+
+
+def test_large_cpu_build_encodes_through_a_process_pool(build_rag, encoder, monkeypatch):
+    import app.core.rag_system as rag_module
+    monkeypatch.setattr(rag_module, 'MULTI_PROCESS_MIN_TEXTS', 50)
+    monkeypatch.setattr(rag_module.os, 'cpu_count', lambda: 8)
+
+    rag = build_rag('brute', n=120, save=False)
+    assert encoder.pool_encoded == [120]
+    assert encoder.pools == [] and encoder.stopped_pools == 1
+    assert rag.embeddings.shape == (120, encoder.dim)
+
+
+def test_small_cpu_build_skips_the_process_pool(build_rag, encoder):
+    build_rag('brute', n=40, save=False)
+    assert encoder.pool_encoded == [] and encoder.stopped_pools == 0
+
+
+def test_externally_assigned_model_encodes_without_a_device(tmp_path):
+    from tests.conftest import FakeEncoder, make_frame
+    csv = tmp_path / 'questions.csv'
+    make_frame(20).to_csv(csv, index=False)
+    rag = BengaliRAGSystem(index_type='brute')
+    rag.load_data(str(csv))
+    rag.model = FakeEncoder()
+
+    rag.compute_embeddings()
+    assert rag.device is None and rag.embeddings.shape == (20, rag.model.dim)
+
+
+def test_rebuild_only_encodes_changed_rows(tmp_path, build_rag, encoder):
+    first = build_rag('brute', n=30)
+    edited = first.data.copy()
+    edited.loc[edited.index[4], 'Question_Cleaned'] = 'সম্পাদিত প্রশ্ন'
+
+    rag = BengaliRAGSystem(index_type='brute')
+    rag.data = edited
+    encoder.encoded.clear()
+    rag.compute_embeddings(str(tmp_path / 'embeddings'))
+
+    assert len(encoder.encoded) == 1 and len(encoder.encoded[0]) == 1
+    assert encoder.encoded[0][0].startswith('সম্পাদিত প্রশ্ন')
+    unchanged = np.arange(30) != 4
+    # Reused rows are only re-normalized, which moves them by at most a few ulp
+    np.testing.assert_allclose(rag.embeddings[unchanged], np.asarray(first.embeddings)[unchanged], atol=1e-6)
+
+
+def test_int8_codes_track_the_float_scan(tmp_path, build_rag):
+    pytest.importorskip('simsimd')
+    build_rag('int8')
+    loaded = BengaliRAGSystem(index_type='int8')
+    loaded.load_embeddings(str(tmp_path / 'embeddings'))
+    assert loaded.embeddings_i8 is not None and loaded.embeddings_i8.dtype == np.int8
+
+    queries = loaded._encode_queries(['প্রশ্ন 3', 'অন্য কিছু', 'তৃতীয়', 'চতুর্থ'])
+    similarities, indices = loaded._knn(queries, 10)
+    expected_similarities, expected = loaded._matmul_search(queries, 10)
+    # Quantization perturbs scores by well under 1%, so only near-ties may swap: each hit's exact score is
+    # within that margin of the exact score at its rank
+    exact = np.take_along_axis(queries @ np.asarray(loaded.embeddings).T, indices, axis=1)
+    np.testing.assert_allclose(exact, expected_similarities, atol=1e-2)
+    np.testing.assert_allclose(similarities, expected_similarities, atol=1e-2)
+    recall = np.mean([len(set(got) & set(want)) / 10 for got, want in zip(indices, expected)])
+    assert recall >= 0.9
+
+
+def test_hnswlib_serves_hnsw_without_faiss(tmp_path, build_rag, monkeypatch):
+    pytest.importorskip('hnswlib')
+    from app.core import rag_system
+    monkeypatch.setattr(rag_system, 'faiss', None)
+    rag = build_rag('hnsw')
+    assert rag.nn_index is None and rag.hnsw_index is not None
+    assert (tmp_path / 'embeddings.hnsw').exists()
+
+    loaded = BengaliRAGSystem(index_type='hnsw')
+    loaded.load_embeddings(str(tmp_path / 'embeddings'))
+    assert loaded.hnsw_index is not None and loaded.hnsw_index.get_current_count() == 200
+
+    queries = loaded._encode_queries(['প্রশ্ন 3', 'অন্য কিছু'])
+    similarities, indices = loaded._knn(queries, 5)
+    expected_similarities, expected = loaded._matmul_search(queries, 5)
+    # With M=32 a 200-node graph is nearly complete, so the approximate search is exact here
+    np.testing.assert_array_equal(indices, expected)
+    np.testing.assert_allclose(similarities, expected_similarities, atol=1e-5)
+
+
+def test_fp16_matrix_serves_fp16_without_faiss(tmp_path, build_rag, monkeypatch):
+    from app.core import rag_system
+    monkeypatch.setattr(rag_system, 'faiss', None)
+    build_rag('fp16')
+    loaded = BengaliRAGSystem(index_type='fp16')
+    loaded.load_embeddings(str(tmp_path / 'embeddings'))
+    assert loaded.nn_index is None and loaded.embeddings_f16.dtype == np.float16
+
+    queries = loaded._encode_queries(['প্রশ্ন 3', 'অন্য কিছু'])
+    expected_similarities, expected = loaded._matmul_search(queries, 5)
+    for simd in ([rag_system.simsimd, None] if rag_system.simsimd is not None else [None]):
+        # Both the SimSIMD kernel and the blocked NumPy cast
+        monkeypatch.setattr(rag_system, 'simsimd', simd)
+        similarities, indices = loaded._knn(queries, 5)
+        np.testing.assert_array_equal(indices, expected)
+        np.testing.assert_allclose(similarities, expected_similarities, atol=1e-3)
+
+
+def test_legacy_pickle_is_migrated_to_mmap_artifacts(tmp_path, build_rag):
+    source = build_rag('brute', save=False)
+    legacy = tmp_path / 'legacy.pkl'
+    with open(legacy, 'wb') as f:
+        # The pre-.npy format: one pickle of the matrix and the frame as it was before derived columns
+        pickle.dump({'embeddings': np.asarray(source.embeddings), 'model_name': source.model_name,
+                     'data': source.data.drop(columns=['Answer_Text'])}, f)
+
+    migrated = BengaliRAGSystem(index_type='brute')
+    migrated.load_embeddings(str(legacy))
+    base = tmp_path / 'legacy'
+    assert all((tmp_path / f'legacy.{ext}').exists() for ext in ('npy', 'parquet', 'json'))
+    assert migrated.data['Answer_Text'].tolist() == source.data['Answer_Text'].tolist()
+
+    reloaded = BengaliRAGSystem(index_type='brute')
+    reloaded.load_embeddings(str(base))
+    assert isinstance(reloaded.embeddings, np.memmap)
+    queries = ['প্রশ্ন 3', 'অন্য কিছু']
+    for rag in (migrated, reloaded):
+        _, indices = rag.retrieve_indices(queries, k=5)
+        np.testing.assert_array_equal(indices, _reference(source, queries, 5))
+
+
+def test_query_embedding_is_cached_across_k(build_rag, encoder):
+    rag = build_rag('brute', save=False)
+    encoder.encoded.clear()
+    top3 = rag.search('প্রশ্ন 3', k=3)
+    top5 = rag.search('প্রশ্ন 3', k=5)
+
+    # A new k misses the result cache but reuses the embedding: one encoder call in total
+    assert len(encoder.encoded) == 1
+    assert [hit['rank'] for hit in top5] == [1, 2, 3, 4, 5]
+    assert [hit['id'] for hit in top5[:3]] == [hit['id'] for hit in top3]
+    expected = _reference(rag, ['প্রশ্ন 3'], 5)[0]
+    assert [hit['id'] for hit in top5] == rag.data['ID'].iloc[expected].tolist()
+
+
+def test_search_batch_encodes_duplicate_queries_once(build_rag, encoder):
+    rag = build_rag('brute', save=False, query_cache_size=0)
+    encoder.encoded.clear()
+    queries = ['প্রশ্ন 3', 'অন্য কিছু', 'প্রশ্ন 3', 'প্রশ্ন 3']
+    results = rag.search_batch(queries, k=4)
+
+    assert encoder.encoded == [['প্রশ্ন 3', 'অন্য কিছু']]
+    expected = _reference(rag, queries, 4)
+    for hits, want in zip(results, expected):
+        assert [hit['id'] for hit in hits] == rag.data['ID'].iloc[want].tolist()
+    # Duplicates get equal but independent result lists
+    assert results[0] == results[2] and results[0] is not results[2]
+
+
+def test_format_results_matches_per_row_construction(build_rag):
+    rag = build_rag('brute', n=30, save=False)
+    similarities = np.array([0.9, 0.5, 0.25, -1.0], dtype=np.float32)
+    indices = np.array([4, 0, 13, -1])
+    results = rag._format_results(similarities, indices)
+
+    expected = []
+    for similarity, idx in zip(similarities[:3], indices[:3]):
+        # The original per-hit build: a row Series per hit, NaN -> None, native Python scalars
+        row = rag.data.iloc[idx]
+        hit = {'rank': len(expected) + 1}
+        for column, key in rag.RESULT_FIELDS.items():
+            value = row[column]
+            hit[key] = None if pd.isna(value) else (value.item() if hasattr(value, 'item') else value)
+        hit['similarity_score'] = float(similarity)
+        hit['distance'] = 1 - float(similarity)
+        expected.append(hit)
+
+    # -1 padding is dropped; key order, values and value types all match
+    assert results == expected
+    assert [list(hit) for hit in results] == [list(hit) for hit in expected]
+    assert [type(v) for hit in results for v in hit.values()] == [type(v) for hit in expected for v in hit.values()]